@@ -31,3 +31,52 @@ class SQLFoxRefusedToRecreateDB(Exception):
     """When user disagrees to recreate a database."""
     def __init__(self):
         logger.critical('You have refused to recreate the database.')
+
+
+class SQLFoxWriteBehindNotStarted(Exception):
+    """When someone tries to use write-behind queue without starting it"""
+    def __init__(self):
+        logger.critical('Write-behind queue is not started! Did you call "write_behind_start"?')
+
+
+class SQLFoxWriteBehindQueueFull(Exception):
+    """When write-behind queue stays full longer than the caller agreed to wait"""
+    def __init__(self, max_queue_size):
+        self.max_queue_size = max_queue_size
+        logger.warning(f'Write-behind queue is full ({self.max_queue_size} rows)!')
+
+
+class SQLFoxIncorrectShardMap(Exception):
+    """When shards dictionary in db_init is incorrect"""
+    def __init__(self):
+        logger.critical('Incorrect shards dictionary!')
+
+
+class SQLFoxShardNotFound(Exception):
+    """When shard function can't find a shard for a shard key value"""
+    def __init__(self, table_name, value):
+        self.table_name = table_name
+        self.value = value
+        logger.critical(f"There is no shard of '{self.table_name}' for {self.value!r}!")
+
+
+class SQLFoxIncorrectRow(Exception):
+    """When something which is not a row of a db_init table class is passed as a row"""
+    def __init__(self, row):
+        self.row = row
+        logger.critical(f'{self.row!r} is not a row of your database!')
+
+
+class SQLFoxShardedPrimaryKey(Exception):
+    """When primary key of a sharded table is generated by the database instead of being set explicitly"""
+    def __init__(self, table_name):
+        self.table_name = table_name
+        logger.critical(f"Rows of sharded '{self.table_name}' need explicit primary keys unique across all shards!")
+
+
+class SQLFoxShardKeyUpdate(Exception):
+    """When someone tries to change shard key of sharded rows with update"""
+    def __init__(self, table_name, shard_key):
+        self.table_name = table_name
+        self.shard_key = shard_key
+        logger.critical(f"'{self.shard_key}' of sharded '{self.table_name}' can't be updated, rows won't move to another shard!")
@@ -2,4 +2,7 @@
 Made with love by russkiylis, 2024. See LICENSE.
 """
 from sql_fox.db_init import db_connect, db_disconnect, data_type_mapping, db_create, db_check, db_clear_all, db_init
-from sql_fox.core import session_autoopen_close_decorator, add, get, delete, update
+from sql_fox.core import session_autoopen_close_decorator, add, get, delete, update, statement_cache_info, \
+    statement_cache_clear
+from sql_fox.shards import shards_connect, shards_disconnect
+from sql_fox.write_behind import write_behind_start, write_behind_stop, write_behind_flush, add_later
@@ -1,7 +1,9 @@
-__all__ = ["session_autoopen_close_decorator", "add", "get", "delete", "update"]
+__all__ = ["session_autoopen_close_decorator", "add", "get", "delete", "update", "statement_cache_info",
+           "statement_cache_clear"]
 
 from sql_fox.imports import *
 import sql_fox.settings as settings
+from sql_fox.shards import shard_sessions, shard_session_for_row, shard_key, fan_out
 
 
 def session_autoopen_close_decorator(func):
@@ -22,6 +24,106 @@ def session_autoopen_close_decorator(func):
     return wrapper
 
 
+# Here we store built statements. Key is (operation, table class, filters shape, ...), values are bound later.
+# SQLAlchemy caches compiled SQL for every statement it has seen, so reusing statements skips building and compiling.
+_statement_cache = OrderedDict()
+_statement_cache_lock = threading.Lock()
+_statement_cache_stats = {'max_size': 512, 'hits': 0, 'misses': 0}
+
+_operators = {
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    ">": lambda column, value: column > value,
+    "<": lambda column, value: column < value,
+    ">=": lambda column, value: column >= value,
+    "<=": lambda column, value: column <= value,
+    "like": lambda column, value: column.like(value),
+    "in": lambda column, value: column.in_(value),
+}
+
+# These are not for users, _filters_shape makes them from {'column': None} and {'column': {'!=': None}}
+_null_operators = {
+    "is": lambda column: column.is_(None),
+    "is not": lambda column: column.is_not(None),
+}
+
+
+def statement_cache_info() -> dict:
+    """
+    Use it to see how well the statement cache works.
+    :return: Dict with size, max_size, hits, misses and hit_rate.
+    """
+    with _statement_cache_lock:
+        hits, misses = _statement_cache_stats['hits'], _statement_cache_stats['misses']
+        return {'size': len(_statement_cache), 'max_size': _statement_cache_stats['max_size'], 'hits': hits,
+                'misses': misses, 'hit_rate': hits / (hits + misses) if hits + misses else 0.0}
+
+
+def statement_cache_clear(max_size: int = None):
+    """
+    Use it to clear the statement cache and its statistics.
+    :param max_size: New max number of cached statements. 0 disables the cache.
+    :return:
+    """
+    with _statement_cache_lock:
+        _statement_cache.clear()
+        _statement_cache_stats['hits'] = 0
+        _statement_cache_stats['misses'] = 0
+        if max_size is not None:
+            _statement_cache_stats['max_size'] = max_size
+
+
+def _cached_statement(key: tuple, build):
+    """Returns a cached statement for key or builds it with build() and caches it."""
+    with _statement_cache_lock:
+        statement = _statement_cache.get(key)
+        if statement is not None:
+            _statement_cache.move_to_end(key)
+            _statement_cache_stats['hits'] += 1
+            return statement
+        _statement_cache_stats['misses'] += 1
+
+    statement = build()
+
+    with _statement_cache_lock:
+        _statement_cache[key] = statement
+        while len(_statement_cache) > _statement_cache_stats['max_size']:
+            _statement_cache.popitem(last=False)
+    return statement
+
+
+def _filters_shape(filters: dict) -> (tuple, dict):
+    """
+    Splits filters into their shape ((column, operator), ...) and values for bound parameters.
+    Statements with the same shape are the same, only values differ.
+    """
+    shape = []
+    params = {}
+    if filters:
+        for key, condition in filters.items():
+            for operator, value in (condition.items() if isinstance(condition, dict) else (("==", condition),)):
+                if value is None and operator in ("==", "!="):  # column = NULL is never true, we need IS NULL
+                    operator = "is" if operator == "==" else "is not"
+                elif operator not in _operators:
+                    continue
+                else:
+                    params[f'f_{len(shape)}'] = value
+                shape.append((key, operator))
+    return tuple(shape), params
+
+
+def _where(row_class, shape: tuple) -> list:
+    """Builds conditions with bound parameters from filters shape."""
+    conditions = []
+    for i, (key, operator) in enumerate(shape):
+        column = getattr(row_class, key)
+        if operator in _null_operators:
+            conditions.append(_null_operators[operator](column))
+        else:
+            conditions.append(_operators[operator](column, bindparam(f'f_{i}', expanding=operator == "in")))
+    return conditions
+
+
 @session_autoopen_close_decorator
 def add(db, row):
     """
@@ -31,9 +133,12 @@ def add(db, row):
     :param row: A class filled with data. For example, if you have table 'users', db_init will provide you with 'users' class.
     :return:
     """
-    db.add(row)
-    db.commit()
-    db.refresh(row)
+    def add_row(shard_db):
+        shard_db.add(row)
+        shard_db.commit()
+        shard_db.refresh(row)
+
+    fan_out(db, [shard_session_for_row(db, row)], add_row)
 
 
 @session_autoopen_close_decorator
@@ -48,39 +153,33 @@ def get(db, row_class, filters: dict = None, skip: int = 0, limit: int = 1):
     :param limit: If you need n rows.
     :return: A list of rows or one row, don't touch skip and limit for one row.
     """
-    query = db.query(row_class)
-    conditions = []
-    if filters:
-        for key, condition in filters.items():
-            column = getattr(row_class, key)
-            if isinstance(condition, dict):
-                for operator, value in condition.items():
-                    if operator == "==":
-                        conditions.append(column == value)
-                    elif operator == "!=":
-                        conditions.append(column != value)
-                    elif operator == ">":
-                        conditions.append(column > value)
-                    elif operator == "<":
-                        conditions.append(column < value)
-                    elif operator == ">=":
-                        conditions.append(column >= value)
-                    elif operator == "<=":
-                        conditions.append(column <= value)
-                    elif operator == "like":
-                        conditions.append(column.like(value))
-                    elif operator == "in":
-                        conditions.append(column.in_(value))
-            else:
-                conditions.append(column == condition)
-
-            if conditions:
-                query = query.filter(and_(*conditions))
+    shape, params = _filters_shape(filters)
+    sessions = shard_sessions(db, row_class, filters)
+
+    if shard_key(row_class) is not None:  # Every shard returns its first skip + limit rows by primary key, we merge them
+        primary_key = [column.name for column in row_class.__table__.primary_key]
+        statement = _cached_statement(('get_sharded', row_class, shape),
+                                      lambda: select(row_class).where(*_where(row_class, shape))
+                                      .order_by(*[getattr(row_class, key) for key in primary_key])
+                                      .limit(bindparam('limit')))
+        results = fan_out(db, sessions, lambda shard_db: shard_db.execute(
+            statement, {**params, 'limit': skip + limit}).scalars().all())
+        rows = list(heapq.merge(*results, key=lambda row: tuple(getattr(row, key) for key in primary_key)))
+        rows = rows[skip:skip + limit]
+        if skip == 0 and limit == 1:
+            return rows[0] if rows else None
+        return rows
 
     if skip == 0 and limit == 1:
-        return query.first()
+        statement = _cached_statement(('get_first', row_class, shape),
+                                      lambda: select(row_class).where(*_where(row_class, shape)).limit(1))
+        return fan_out(db, sessions, lambda shard_db: shard_db.execute(statement, params).scalars().first())[0]
     else:
-        return query.skip(skip).limit(limit).all()
+        statement = _cached_statement(('get', row_class, shape),
+                                      lambda: select(row_class).where(*_where(row_class, shape))
+                                      .offset(bindparam('skip')).limit(bindparam('limit')))
+        return fan_out(db, sessions, lambda shard_db: shard_db.execute(
+            statement, {**params, 'skip': skip, 'limit': limit}).scalars().all())[0]
 
 
 @session_autoopen_close_decorator
@@ -95,44 +194,17 @@ def delete(db, row_class, filters: dict = None, skip: int = 0, limit: int = 1) -
     :param limit: If you need n rows.
     :return: Number of deleted rows.
     """
-    query = db.query(row_class)
-    count = 0
-    conditions = []
+    shape, params = _filters_shape(filters)
+    statement = _cached_statement(('delete', row_class, shape),
+                                  lambda: sql_delete(row_class).where(*_where(row_class, shape))
+                                  .execution_options(synchronize_session=False))
 
-    if filters:
-        for key, condition in filters.items():
-            column = getattr(row_class, key)
-            if isinstance(condition, dict):
-                for operator, value in condition.items():
-                    if operator == "==":
-                        conditions.append(column == value)
-                    elif operator == "!=":
-                        conditions.append(column != value)
-                    elif operator == ">":
-                        conditions.append(column > value)
-                    elif operator == "<":
-                        conditions.append(column < value)
-                    elif operator == ">=":
-                        conditions.append(column >= value)
-                    elif operator == "<=":
-                        conditions.append(column <= value)
-                    elif operator == "like":
-                        conditions.append(column.like(value))
-                    elif operator == "in":
-                        conditions.append(column.in_(value))
-            else:
-                conditions.append(column == condition)
-
-            if conditions:
-                query = query.filter(and_(*conditions))
-
-    if query:
-        for instance in query.all():
-            count += 1
-            db.delete(instance)
-
-    db.commit()
-    return count
+    def delete_rows(shard_db):
+        count = shard_db.execute(statement, params).rowcount
+        shard_db.commit()
+        return count
+
+    return sum(fan_out(db, shard_sessions(db, row_class, filters), delete_rows))
 
 
 @session_autoopen_close_decorator
@@ -145,49 +217,36 @@ def update(db, row, filters: dict):
     :param filters: Dict of filters. if complex, {'email': {'like', 'russkiylis%'}}, if not, {'email': 'russkiylis@koshy.ru'}
     :return: Number of updated rows.
     """
-    query = db.query(row.__class__)
-    count = 0
-    conditions = []
-
-    if filters:
-        for key, condition in filters.items():
-            column = getattr(row.__class__, key)
-            if isinstance(condition, dict):
-                for operator, value in condition.items():
-                    if operator == "==":
-                        conditions.append(column == value)
-                    elif operator == "!=":
-                        conditions.append(column != value)
-                    elif operator == ">":
-                        conditions.append(column > value)
-                    elif operator == "<":
-                        conditions.append(column < value)
-                    elif operator == ">=":
-                        conditions.append(column >= value)
-                    elif operator == "<=":
-                        conditions.append(column <= value)
-                    elif operator == "like":
-                        conditions.append(column.like(value))
-                    elif operator == "in":
-                        conditions.append(column.in_(value))
-            else:
-                conditions.append(column == condition)
-
-            if conditions:
-                query = query.filter(and_(*conditions))
-
-    found_instances = query.all()
-    count = 0
-    for instance in found_instances:
-        for attr in row.__mapper__.column_attrs:
-            key = attr.key
-            new_value = getattr(row, key)
-            if new_value is not None:
-                setattr(instance, key, new_value)
-        db.add(instance)
-        count += 1
-
-    if count > 0:
-        db.commit()
-
-    return count
+    row_class = row.__class__
+    shape, params = _filters_shape(filters)
+    sessions = shard_sessions(db, row_class, filters)
+
+    new_values = {}
+    for attr in row.__mapper__.column_attrs:
+        new_value = getattr(row, attr.key)
+        if new_value is not None:
+            new_values[attr.key] = new_value
+
+    if shard_key(row_class) in new_values:
+        raise SQLFoxShardKeyUpdate(row_class.__table__.name, shard_key(row_class))
+
+    if not new_values:  # Nothing to update, we only count matching rows
+        statement = _cached_statement(('count', row_class, shape),
+                                      lambda: select(func.count()).select_from(row_class)
+                                      .where(*_where(row_class, shape)))
+        return sum(fan_out(db, sessions, lambda shard_db: shard_db.execute(statement, params).scalar()))
+
+    columns = tuple(new_values)
+    statement = _cached_statement(('update', row_class, shape, columns),
+                                  lambda: sql_update(row_class).where(*_where(row_class, shape))
+                                  .values({key: bindparam(f'v_{key}') for key in columns})
+                                  .execution_options(synchronize_session=False))
+    params.update({f'v_{key}': value for key, value in new_values.items()})
+
+    def update_rows(shard_db):
+        count = shard_db.execute(statement, params).rowcount
+        if count > 0:
+            shard_db.commit()
+        return count
+
+    return sum(fan_out(db, sessions, update_rows))
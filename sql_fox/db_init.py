@@ -2,6 +2,8 @@ __all__ = ["db_connect", "db_disconnect", "data_type_mapping", "db_create", "db_
 
 from sql_fox.imports import *
 import sql_fox.settings as settings
+from sql_fox.write_behind import write_behind_stop
+from sql_fox.shards import shards_connect, shards_disconnect
 
 global __engine, __session, __metadata
 
@@ -78,6 +80,8 @@ def db_disconnect(silent: bool = True):
     if not silent:
         logger.info('Disconnecting from database...')
 
+    write_behind_stop(silent)  # Writing everything that is still queued
+    shards_disconnect(silent)
     __engine.dispose()
     __session = None
     __metadata = None
@@ -145,6 +149,12 @@ def db_create(db_structure: dict, silent: bool = True) -> dict:
 
     data_types_mapping = data_type_mapping()
 
+    for table_name, columns in db_structure.items():  # Every shard has its own counter, so autoincrement ids would repeat
+        if table_name.lower() in settings.__shards:
+            for column_attrs in columns.values():
+                if column_attrs.get('primary_key') and column_attrs.get('autoincrement') not in (None, False):
+                    raise SQLFoxShardedPrimaryKey(table_name.lower())
+
     try:
         for table_name, columns in db_structure.items():  # Here we create table_attrs which we usually write manually when creating sqlalchemy table class.
 
@@ -170,12 +180,19 @@ def db_create(db_structure: dict, silent: bool = True) -> dict:
                     column_data_type = data_types_mapping[data_type_split[0]]
 
                 flags = {key: value for key, value in column_attrs.items() if key not in ('data_type',)}
+                if table_name in settings.__shards and flags.get('primary_key'):
+                    flags['autoincrement'] = False
 
                 table_attrs[column_name] = Column(column_data_type, **flags)  # Table attrs ready to be used in table class creation.
 
             table_classes[table_name] = type(table_name, (base,), table_attrs)  # Here we create a table class.
 
-        base.metadata.create_all(__engine)  # Here we create a database structure.
+        base.metadata.create_all(__engine, tables=[table for table_name, table in base.metadata.tables.items()
+                                                   if table_name not in settings.__shards])  # Here we create a database structure.
+
+        for table_name, shard in settings.__shards.items():  # Sharded tables live only in their shards
+            for engine in shard['engines']:
+                base.metadata.tables[table_name].create(engine, checkfirst=True)
 
         if not silent:
             logger.success(f"Successfully created a database structure!")
@@ -235,22 +252,24 @@ def db_check(db_structure: dict, silent: bool = True) -> bool:
     # data_types_mapping = data_type_mapping()
 
     inspector = Inspector.from_engine(__engine)  # Creating inspector
+    shard_inspectors = {table_name: [Inspector.from_engine(engine) for engine in shard['engines']]
+                        for table_name, shard in settings.__shards.items()}  # Sharded tables are checked in every shard
 
-    existing_tables = inspector.get_table_names()
     for table_name, columns in db_structure.items():
         table_name = table_name.lower()
-        if table_name not in existing_tables:  # if we don't have a table, db_check will return False
-            if not silent:
-                logger.error(f"Mismatch! No '{table_name}'.")
-            return False
-
-        existing_columns = {column['name']: column for column in inspector.get_columns(table_name)}
-        for column_name, column_attrs in columns.items():
-            column_name = column_name.lower()
-            if column_name not in existing_columns:  # if we don't have a column, db_check will return False
+        for table_inspector in shard_inspectors.get(table_name, [inspector]):
+            if table_name not in table_inspector.get_table_names():  # if we don't have a table, db_check will return False
                 if not silent:
-                    logger.error(f"Mismatch! No '{column_name}' in '{table_name}'.")
+                    logger.error(f"Mismatch! No '{table_name}'.")
                 return False
+
+            existing_columns = {column['name']: column for column in table_inspector.get_columns(table_name)}
+            for column_name, column_attrs in columns.items():
+                column_name = column_name.lower()
+                if column_name not in existing_columns:  # if we don't have a column, db_check will return False
+                    if not silent:
+                        logger.error(f"Mismatch! No '{column_name}' in '{table_name}'.")
+                    return False
     return True
     # todo I also need to check data_type and flags. Unfortunately I don't know how to do it, also i don't have much time.
 
@@ -275,11 +294,17 @@ def db_clear_all(silent: bool = True):
 
     __metadata.reflect(bind=__engine)
 
+    for shard in settings.__shards.values():
+        for engine in shard['engines']:
+            shard_metadata = MetaData()
+            shard_metadata.reflect(bind=engine)
+            shard_metadata.drop_all(bind=engine, checkfirst=False)
+
     if not silent:
         logger.success("All generated tables have been successfully deleted")
 
 
-def db_init(db_structure: dict, db_type: str = 'SQLite', silent: bool = True, **kwargs) -> dict:
+def db_init(db_structure: dict, db_type: str = 'SQLite', silent: bool = True, shards: dict = None, **kwargs) -> dict:
     """
     This function is usually the only function you want to use if you want to initialize your database.
     It contains other initializing functions such as db_connect, db_check, db_clear_all and db_create.
@@ -318,15 +343,33 @@ def db_init(db_structure: dict, db_type: str = 'SQLite', silent: bool = True, **
     comment: Adds a comment or description to the column.
     onupdate: Defines a value or function that is applied to the column whenever the row is updated.
 
+    If a table is too big for one file, you can split it across SQLite files with shards:
+    {
+        'table_name': {
+            'shard_key': 'column_name',
+            'db_paths': ['table_name_0.db', 'table_name_1.db'],
+            'function': 'hash'},
+        'another_table': {...}}
+
+    function is 'hash' (default) or your function(shard_key_value) -> index in db_paths, for example by date ranges.
+    add puts a row into its shard. get, update and delete only go to shards pinned by shard_key filters
+    ({'tenant_id': 5} or {'tenant_id': {'in': [5, 6]}}), otherwise they query all shards in parallel.
+    Rows of sharded tables are ordered by primary key. shard_key can't be updated, rows don't move between shards.
+    Every shard file has its own id counter, so primary keys of sharded tables can't be autoincrement. Set them
+    yourself (or with a default function, uuid for example), unique across all shards. If primary key includes
+    shard_key, per-shard uniqueness is enough.
+
     :param db_structure: a structure of your database.
     :param db_type: (str) Defines a database type. It can be 'sqlite', 'mysql'
     :param silent: silence in console?
+    :param shards: a shard map of your database. Tables which are not in it stay in the main database.
     :param kwargs: (str) Use it to connect to your database. SQLite - db_path,
                                                              MySQL/MariaDB - username, password, db_address, db_name
     :return: All table classes stored in one dictionary. Their keys are similar to table_names but not capitalized.
     """
 
     db_connect(db_type, silent, **kwargs)  # Connecting to db
+    shards_connect(shards or {}, silent)  # Connecting to shards
 
     if not db_check(db_structure, silent):  # Checking db
         if not silent:
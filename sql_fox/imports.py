@@ -3,12 +3,23 @@ Database packages:
 
 MySQL/MariaDB: PyMySQL
 """
-from sqlalchemy import create_engine, Column, Integer, String, MetaData, types, and_, or_
+from sqlalchemy import create_engine, Column, Integer, String, MetaData, types, and_, or_, select, bindparam, func
+from sqlalchemy import update as sql_update, delete as sql_delete, inspect as sql_inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm.state import InstanceState
 from sqlalchemy.engine.reflection import Inspector
 from sql_fox.Exceptions import *
 
 from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import inspect
+
+import threading
+import queue
+import time
+import atexit
+import heapq
+import hashlib
@@ -1,2 +1,5 @@
 global __session
 global __db_connected
+__write_behind = None
+__shards = {}
+__shards_executor = None
@@ -0,0 +1,160 @@
+__all__ = ["shards_connect", "shards_disconnect"]
+
+from sql_fox.imports import *
+import sql_fox.settings as settings
+
+
+def _hash_function(db_paths: list):
+    """Default shard function. md5 is used because hash() of str differs between python processes."""
+    return lambda value: int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], 'big') % len(db_paths)
+
+
+def shards_connect(shards: dict, silent: bool = True):
+    """
+    Use it to connect to SQLite files of sharded tables. db_init calls it for you.
+
+    Your shards should look like:
+        {
+            'table_name': {
+                'shard_key': 'column_name',
+                'db_paths': ['table_name_0.db', 'table_name_1.db'],
+                'function': 'hash'},
+            'another_table': {...}}
+
+    function is 'hash' (default) or your function(shard_key_value) -> index in db_paths, for example by date ranges.
+    Primary keys of sharded tables must be set explicitly and be unique across all shards, see db_init.
+
+    :param shards: a shard map of your database.
+    :param silent: silence in console?
+    :return:
+    """
+    shards_disconnect(silent)
+
+    connected_shards = {}
+    try:
+        for table_name, shard in shards.items():
+            table_name = table_name.lower()
+            db_paths = shard['db_paths']
+            function = shard.get('function', 'hash')
+            if function != 'hash' and not callable(function):
+                raise SQLFoxIncorrectShardMap
+
+            if not silent:
+                logger.info(f"Connecting to {len(db_paths)} shards of '{table_name}'...")
+
+            engines = [create_engine(f'sqlite:///{db_path}', echo=True if not silent else False) for db_path in db_paths]
+            connected_shards[table_name] = {
+                'shard_key': shard['shard_key'].lower(),
+                'function': _hash_function(db_paths) if function == 'hash' else function,
+                'engines': engines,
+                'sessions': [scoped_session(sessionmaker(bind=engine)) for engine in engines],
+            }
+    except Exception:
+        raise SQLFoxIncorrectShardMap
+
+    settings.__shards = connected_shards
+    if connected_shards:
+        settings.__shards_executor = ThreadPoolExecutor(
+            max_workers=sum(len(shard['engines']) for shard in connected_shards.values()),
+            thread_name_prefix='sql-fox-shard')
+
+
+def shards_disconnect(silent: bool = True):
+    """
+    Use it to disconnect from all shards. db_disconnect calls it for you.
+    :param silent: silence in console?
+    :return:
+    """
+    if settings.__shards and not silent:
+        logger.info('Disconnecting from shards...')
+
+    if settings.__shards_executor is not None:
+        settings.__shards_executor.shutdown()
+        settings.__shards_executor = None
+
+    for shard in settings.__shards.values():
+        for engine in shard['engines']:
+            engine.dispose()
+    settings.__shards = {}
+
+
+def _shard_index(table_name: str, value):
+    """Returns index of the shard for shard key value or None if shard function can't map it."""
+    shard = settings.__shards[table_name]
+    try:
+        index = shard['function'](value)
+    except Exception:
+        return None
+    if not isinstance(index, int) or not 0 <= index < len(shard['sessions']):
+        return None
+    return index
+
+
+def shard_key(row_class):
+    """Returns shard key column name of row_class or None if its table is not sharded."""
+    shard = settings.__shards.get(row_class.__table__.name)
+    return shard['shard_key'] if shard else None
+
+
+def shard_session_for_row(db, row):
+    """Returns a session of the shard where row lives. db is returned if row's table is not sharded."""
+    table_name = row.__table__.name
+    if table_name not in settings.__shards:
+        return db
+
+    if any(getattr(row, column.name) is None and column.default is None for column in row.__table__.primary_key):
+        raise SQLFoxShardedPrimaryKey(table_name)  # Every shard would generate the same ids
+
+    shard = settings.__shards[table_name]
+    value = getattr(row, shard['shard_key'])
+    index = _shard_index(table_name, value)
+    if index is None:
+        raise SQLFoxShardNotFound(table_name, value)
+    return shard['sessions'][index]
+
+
+def shard_sessions(db, row_class, filters: dict = None) -> list:
+    """
+    Returns sessions of shards which can contain rows matching filters. db is returned if the table is not sharded.
+    If filters pin the shard key with a value, '==' or 'in', only those shards are returned, otherwise all of them.
+    Values which shard function can't map have no rows, so the list can be empty.
+    """
+    table_name = row_class.__table__.name
+    if table_name not in settings.__shards:
+        return [db]
+
+    shard = settings.__shards[table_name]
+    values = None
+    for key, condition in (filters or {}).items():
+        if key.lower() != shard['shard_key']:
+            continue
+        if not isinstance(condition, dict):
+            values = [condition]
+        elif "==" in condition:
+            values = [condition["=="]]
+        elif "in" in condition:
+            values = list(condition["in"])
+
+    if values is None:
+        return list(shard['sessions'])
+
+    indexes = sorted({index for index in (_shard_index(table_name, value) for value in values) if index is not None})
+    return [shard['sessions'][index] for index in indexes]
+
+
+def fan_out(db, sessions: list, func) -> list:
+    """
+    Runs func(session) for every session and returns results in the same order.
+    More than one session means shards, they are queried in parallel. Shard sessions are closed afterwards,
+    db is closed by session_autoopen_close_decorator.
+    """
+    def run(session):
+        try:
+            return func(session)
+        finally:
+            if session is not db:
+                session.remove()
+
+    if len(sessions) <= 1:
+        return [run(session) for session in sessions]
+    return list(settings.__shards_executor.map(run, sessions))
@@ -0,0 +1,306 @@
+__all__ = ["write_behind_start", "write_behind_stop", "write_behind_flush", "add_later"]
+
+from sql_fox.imports import *
+import sql_fox.settings as settings
+from sql_fox.shards import shard_session_for_row
+
+_STOP = object()
+
+
+class _WriteBehind:
+    """State of the background writer. Only one exists at a time, it is stored in settings.__write_behind."""
+    def __init__(self, batch_size: int, flush_interval: float, max_queue_size: int, on_error, silent: bool):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.on_error = on_error
+        self.silent = silent
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = threading.Thread(target=_worker, args=(self,), name='sql-fox-write-behind', daemon=True)
+        self.pending = {}  # Here the writer stores queued rows grouped by their table
+        self.closed = False  # True when write_behind_stop was called, add_later refuses new rows after that
+        self.stop_requested = False  # True when write_behind_stop was called by the writer itself (from on_error)
+        self.putting = 0  # How many add_later calls are putting rows into the queue right now
+        self.condition = threading.Condition()
+
+
+_start_stop_lock = threading.RLock()
+_writer = threading.local()  # _writer.write_behind is set only inside the writer thread
+
+
+def _worker(write_behind: _WriteBehind):
+    """Background thread. Collects rows from the queue and writes them in batches."""
+    _writer.write_behind = write_behind
+    pending = write_behind.pending
+    last_flush = time.monotonic()
+
+    while True:
+        timeout = max(0.0, write_behind.flush_interval - (time.monotonic() - last_flush))
+        try:
+            item = write_behind.queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        if item is not _STOP:
+            try:
+                _handle(write_behind, pending, item)
+                if isinstance(item, threading.Event):
+                    last_flush = time.monotonic()
+                elif time.monotonic() - last_flush >= write_behind.flush_interval:
+                    _flush_all(write_behind, pending)
+                    last_flush = time.monotonic()
+            except Exception as e:  # Batches report their rows themselves, the writer just must never die
+                logger.error(f"Write-behind writer error: {e}")
+
+        if item is _STOP or write_behind.stop_requested:
+            _drain(write_behind, pending)  # Nothing should be here, but we never drop rows silently
+            _flush_all(write_behind, pending)
+            settings.__session.remove()
+            for shard in settings.__shards.values():
+                for session in shard['sessions']:
+                    session.remove()
+            return
+
+
+def _handle(write_behind: _WriteBehind, pending: dict, item):
+    """Puts a row into pending or flushes everything if somebody called write_behind_flush and waits for us."""
+    if isinstance(item, threading.Event):
+        try:
+            _flush_all(write_behind, pending)
+        finally:
+            item.set()
+    elif item is not None:
+        try:
+            table_rows = pending.setdefault(item.__table__.name, [])
+        except Exception as e:
+            _insert_failed(write_behind, e, [item])
+            return
+        table_rows.append(item)
+        if len(table_rows) >= write_behind.batch_size:
+            _flush_rows(write_behind, pending.pop(item.__table__.name))
+
+
+def _drain(write_behind: _WriteBehind, pending: dict):
+    """Takes everything left in the queue without waiting."""
+    while True:
+        try:
+            item = write_behind.queue.get_nowait()
+        except queue.Empty:
+            return
+        if item is _STOP:
+            continue
+        try:
+            _handle(write_behind, pending, item)
+        except Exception as e:
+            _insert_failed(write_behind, e, [item])
+
+
+def _put(write_behind: _WriteBehind, item, block: bool = True, timeout: float = None) -> bool:
+    """
+    Puts item into the queue. Unlike queue.put it gives up if the writer thread is dead, so nobody hangs forever.
+    :return: True if item is in the queue, False if the writer is dead. queue.Full if timeout expired.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while write_behind.thread.is_alive():
+        if not block:
+            write_behind.queue.put_nowait(item)
+            return True
+        wait = 0.1 if deadline is None else min(0.1, deadline - time.monotonic())
+        if wait <= 0:  # Time is over, but we try at least once
+            write_behind.queue.put_nowait(item)
+            return True
+        try:
+            write_behind.queue.put(item, timeout=wait)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _flush_all(write_behind: _WriteBehind, pending: dict):
+    for table_name in list(pending):  # Rows retried by on_error during this loop wait for the next flush
+        rows = pending.pop(table_name, None)  # on_error could have flushed it already with write_behind_flush
+        if rows:
+            _flush_rows(write_behind, rows)
+
+
+def _flush_rows(write_behind: _WriteBehind, rows: list):
+    """Inserts rows of one table, one transaction per shard. If it fails, rows are passed to on_error."""
+    shard_rows = {}
+    for row in rows:
+        try:
+            shard_rows.setdefault(shard_session_for_row(settings.__session, row), []).append(row)
+        except Exception as e:
+            _insert_failed(write_behind, e, [row])
+
+    for db, db_rows in shard_rows.items():
+        _insert_rows(write_behind, db, db_rows)
+
+
+def _insert_rows(write_behind: _WriteBehind, db, rows: list):
+    try:
+        db.add_all(rows)
+        db.commit()
+        if not write_behind.silent:
+            logger.info(f"Write-behind inserted {len(rows)} rows into '{rows[0].__table__.name}'.")
+    except Exception as e:
+        _insert_failed(write_behind, e, rows)  # Before rollback, so rows are reported even if rollback fails
+        try:
+            db.rollback()
+        except Exception as rollback_error:
+            logger.error(f"Write-behind rollback failed: {rollback_error}")
+    finally:
+        try:
+            db.close()
+        except Exception as close_error:
+            logger.error(f"Write-behind failed to close session: {close_error}")
+
+
+def _insert_failed(write_behind: _WriteBehind, e: Exception, rows: list):
+    logger.error(f"Write-behind failed to insert {len(rows)} rows: {e}")
+    if write_behind.on_error is not None:
+        try:
+            write_behind.on_error(e, rows)
+        except Exception as callback_error:
+            logger.error(f"Write-behind on_error callback failed: {callback_error}")
+
+
+def write_behind_start(batch_size: int = 100, flush_interval: float = 1.0, max_queue_size: int = 10000,
+                       on_error=None, silent: bool = True):
+    """
+    Use it to start a background writer for rows you don't need to wait for (logs, events, audit and so on).
+    After that add_later puts rows into a queue and returns immediately. The writer inserts them in batches,
+    one transaction per table, when batch_size rows of a table are queued or every flush_interval seconds.
+    Everything still queued is written on write_behind_stop, db_disconnect or interpreter exit.
+
+    Don't touch a row after passing it to add_later, it belongs to the writer thread now.
+
+    :param batch_size: How many rows of one table are inserted in one transaction.
+    :param flush_interval: Max seconds a row can wait in the queue.
+    :param max_queue_size: If the queue is full, add_later blocks (backpressure).
+    :param on_error: Function(exception, rows) called if a batch can't be inserted. These rows are lost otherwise.
+    :param silent: silence in console?
+    :return:
+    """
+    if not settings.__db_connected:
+        raise SQLFoxNotConnected
+
+    with _start_stop_lock:
+        if settings.__write_behind is not None:
+            write_behind_stop(silent)
+
+        write_behind = _WriteBehind(batch_size, flush_interval, max_queue_size, on_error, silent)
+        write_behind.thread.start()
+        settings.__write_behind = write_behind
+
+    if not silent:
+        logger.info(f'Write-behind started (batch_size={batch_size}, flush_interval={flush_interval}).')
+
+
+def write_behind_stop(silent: bool = True):
+    """
+    Use it to write everything that is still queued and stop the background writer.
+    :param silent: silence in console?
+    :return:
+    """
+    write_behind = getattr(_writer, 'write_behind', None)
+    if write_behind is not None:  # Called from on_error, the writer can't join itself, it stops after this item
+        write_behind.closed = True
+        write_behind.stop_requested = True
+        if _start_stop_lock.acquire(blocking=False):  # If it's locked, somebody is stopping us already
+            try:
+                if settings.__write_behind is write_behind:
+                    settings.__write_behind = None
+            finally:
+                _start_stop_lock.release()
+        return
+
+    with _start_stop_lock:
+        write_behind = settings.__write_behind
+        if write_behind is None:
+            return
+        settings.__write_behind = None
+
+        with write_behind.condition:  # New add_later calls will fail from now on, we wait for running ones
+            write_behind.closed = True
+            write_behind.condition.wait_for(lambda: write_behind.putting == 0)
+
+        if _put(write_behind, _STOP):
+            write_behind.thread.join()
+
+        _drain(write_behind, write_behind.pending)  # If the writer died, we write what is left ourselves
+        _flush_all(write_behind, write_behind.pending)
+
+    if not silent:
+        logger.success('Write-behind stopped, all queued rows are written.')
+
+
+def write_behind_flush(timeout: float = None) -> bool:
+    """
+    Use it to wait until everything queued before this call is written.
+    :param timeout: Max seconds to wait. None to wait forever.
+    :return: True if everything has been written, False if timeout expired.
+    """
+    write_behind = getattr(_writer, 'write_behind', None)
+    if write_behind is not None:  # Called from on_error, the writer can't wait for itself
+        _flush_all(write_behind, write_behind.pending)
+        return True
+
+    write_behind = settings.__write_behind
+    if write_behind is None:
+        raise SQLFoxWriteBehindNotStarted
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    done = threading.Event()
+    try:
+        if not _put(write_behind, done, timeout=timeout):
+            return False
+    except queue.Full:
+        return False
+
+    while not done.wait(0.1 if deadline is None else max(0.0, min(0.1, deadline - time.monotonic()))):
+        if not write_behind.thread.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+            return done.is_set()
+    return True
+
+
+def add_later(row, block: bool = True, timeout: float = None):
+    """
+    Use it to add a row into your database without waiting for commit. Call write_behind_start first.
+
+    :param row: A class filled with data. For example, if you have table 'users', db_init will provide you with 'users' class.
+    :param block: If False, raises SQLFoxWriteBehindQueueFull immediately when the queue is full.
+    :param timeout: Max seconds to wait for a free place in the queue. None to wait forever.
+    :return:
+    """
+    if not isinstance(sql_inspect(row, raiseerr=False), InstanceState):
+        raise SQLFoxIncorrectRow(row)
+
+    write_behind = getattr(_writer, 'write_behind', None)
+    if write_behind is not None:  # Retry from on_error, the writer can't wait for its own queue
+        if write_behind.closed:  # Rows are already reported to on_error, we don't retry during shutdown
+            raise SQLFoxWriteBehindNotStarted
+        write_behind.pending.setdefault(row.__table__.name, []).append(row)
+        return
+
+    write_behind = settings.__write_behind
+    if write_behind is None:
+        raise SQLFoxWriteBehindNotStarted
+
+    with write_behind.condition:
+        if write_behind.closed:
+            raise SQLFoxWriteBehindNotStarted
+        write_behind.putting += 1
+
+    try:
+        if not _put(write_behind, row, block, timeout):
+            raise SQLFoxWriteBehindNotStarted
+    except queue.Full:
+        raise SQLFoxWriteBehindQueueFull(write_behind.max_queue_size)
+    finally:
+        with write_behind.condition:
+            write_behind.putting -= 1
+            write_behind.condition.notify_all()
+
+
+atexit.register(write_behind_stop)
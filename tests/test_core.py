@@ -4,7 +4,7 @@ import datetime
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../sql_fox')))
 from sql_fox.db_init import db_connect, db_create, db_disconnect, db_check, db_clear_all, db_init
-from sql_fox.core import add, get, delete, update
+from sql_fox.core import add, get, delete, update, statement_cache_info, statement_cache_clear
 
 db_structure = {
     'Users': {
@@ -43,3 +43,37 @@ def test_crud():
 
     new_post = posts(title='ураа!', content='еееее')
     update(new_post, {'user_id': 1})
+
+
+def test_statement_cache():
+    if os.path.exists('test_core.db'):
+        os.remove('test_core.db')
+
+    result_classes = db_init(db_structure, 'sqlite', True, db_path='test_core.db')
+    users = result_classes['users']
+    statement_cache_clear()
+
+    for i in range(10):
+        add(users(id=i, name=f'user_{i}', email=f'user_{i}@test.ru'))
+
+    for i in range(10):
+        assert get(users, {'id': i}).name == f'user_{i}'
+    info = statement_cache_info()
+    assert info['size'] == 1 and info['hits'] == 9 and info['misses'] == 1
+
+    assert [user.id for user in get(users, {'id': {'in': [1, 2, 3]}}, skip=1, limit=5)] == [2, 3]
+    assert [user.id for user in get(users, {'id': {'in': [4, 5]}}, limit=5)] == [4, 5]
+    assert get(users, {'id': {'>=': 5, '<': 7}}, limit=10)[-1].id == 6
+
+    assert update(users(name='renamed'), {'id': {'<': 3}}) == 3
+    assert get(users, {'id': 2}).name == 'renamed'
+    assert update(users(), {'name': 'renamed'}) == 3
+
+    assert delete(users, {'name': 'renamed'}) == 3
+    assert get(users, {'id': 0}) is None
+    assert get(users, {'name': None}) is None
+    assert get(users, {'name': {'!=': None}}).id == 3
+    assert len(get(users, {'name': {'is': 'user_3'}}, limit=10)) == 7  # Unknown operators are ignored
+    assert statement_cache_info()['hit_rate'] > 0.5
+
+    db_disconnect(True)
@@ -0,0 +1,85 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../sql_fox')))
+from sql_fox.db_init import db_disconnect, db_init
+from sql_fox.core import add, get, delete, update
+from sql_fox.Exceptions import SQLFoxShardedPrimaryKey, SQLFoxShardKeyUpdate, SQLFoxShardNotFound
+
+import pytest
+
+db_structure = {
+    'Users': {
+        'id': {'data_type': 'Integer', 'primary_key': True},
+        'name': {'data_type': 'String', 'nullable': False},
+    },
+    'Events': {
+        'id': {'data_type': 'Integer', 'primary_key': True},
+        'tenant_id': {'data_type': 'Integer', 'nullable': False},
+        'name': {'data_type': 'String', 'nullable': False},
+    }
+}
+
+shards = {
+    'Events': {
+        'shard_key': 'tenant_id',
+        'db_paths': ['test_shard_0.db', 'test_shard_1.db', 'test_shard_2.db'],
+        'function': lambda tenant_id: tenant_id % 3 if tenant_id >= 0 else None,  # Negative tenants have no shard
+    }
+}
+
+
+def test_shards():
+    for db_path in ['test_shards.db'] + shards['Events']['db_paths']:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+    result_classes = db_init(db_structure, 'sqlite', True, shards=shards, db_path='test_shards.db')
+    users = result_classes['users']
+    events = result_classes['events']
+
+    add(users(id=1, name='main'))
+    for i in range(30):
+        add(events(id=i, tenant_id=i % 5, name=f'event_{i}'))
+
+    assert get(users, {'id': 1}).name == 'main'
+    assert get(events, {'tenant_id': 3, 'id': 8}).name == 'event_8'  # Pinned to one shard
+    assert get(events, {'id': 8}).name == 'event_8'  # Fan out
+    assert [event.id for event in get(events, {'id': {'>=': 10}}, skip=2, limit=5)] == [12, 13, 14, 15, 16]
+    assert [event.id for event in get(events, {'tenant_id': {'in': [1, 4]}}, limit=4)] == [1, 4, 6, 9]
+
+    assert update(events(name='renamed'), {'id': {'<': 10}}) == 10
+    assert get(events, {'id': 9}).name == 'renamed'
+    assert delete(events, {'name': 'renamed'}) == 10
+    assert delete(events, {'tenant_id': 0}) == 4
+    assert get(events, {'id': 0}) is None
+
+    assert get(events, {'tenant_id': {'in': []}}, limit=10) == []  # No shards, no rows
+    assert get(events, {'tenant_id': -1}) is None
+    assert update(events(name='renamed'), {'tenant_id': -1}) == 0
+    assert delete(events, {'tenant_id': {'in': []}}) == 0
+    with pytest.raises(SQLFoxShardNotFound):
+        add(events(id=100, tenant_id=-1, name='nowhere'))
+
+    with pytest.raises(SQLFoxShardedPrimaryKey):
+        add(events(tenant_id=1, name='without id'))
+    with pytest.raises(SQLFoxShardKeyUpdate):
+        update(events(tenant_id=2), {'id': 11})
+
+    # Pinned and fan out reads page in the same primary key order
+    assert [event.id for event in get(events, {'tenant_id': 1}, skip=1, limit=2)] == [16, 21]
+    assert [event.id for event in get(events, {'id': {'in': [11, 16, 21, 26]}}, skip=1, limit=2)] == [16, 21]
+
+    db_disconnect(True)
+
+
+def test_shards_autoincrement():
+    autoincrement_structure = {
+        'Events': {
+            'id': {'data_type': 'Integer', 'primary_key': True, 'autoincrement': True},
+            'tenant_id': {'data_type': 'Integer', 'nullable': False},
+        }
+    }
+    with pytest.raises(SQLFoxShardedPrimaryKey):
+        db_init(autoincrement_structure, 'sqlite', True, shards=shards, db_path='test_shards.db')
+    db_disconnect(True)
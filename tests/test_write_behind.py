@@ -0,0 +1,113 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../sql_fox')))
+from sql_fox.db_init import db_disconnect, db_init
+from sql_fox.core import get
+from sql_fox.write_behind import write_behind_start, write_behind_stop, write_behind_flush, add_later
+from sql_fox.Exceptions import SQLFoxIncorrectRow, SQLFoxWriteBehindNotStarted
+
+import pytest
+import threading
+import time
+
+db_structure = {
+    'Events': {
+        'id': {'data_type': 'Integer', 'primary_key': True},
+        'name': {'data_type': 'String', 'nullable': False},
+    }
+}
+
+
+def test_write_behind():
+    if os.path.exists('test_write_behind.db'):
+        os.remove('test_write_behind.db')
+    result_classes = db_init(db_structure, 'sqlite', True, db_path='test_write_behind.db')
+    events = result_classes['events']
+    errors = []
+
+    write_behind_start(batch_size=10, flush_interval=0.1, on_error=lambda e, rows: errors.append(len(rows)))
+
+    for i in range(25):
+        add_later(events(id=i, name=f'event_{i}'))
+    assert write_behind_flush(5)
+    assert get(events, {'id': 0}).name == 'event_0'
+    assert get(events, {'id': 24}).name == 'event_24'
+
+    add_later(events(id=0, name='duplicate'))  # Breaks unique id, must go to on_error
+    add_later(events(id=100, name='last'))
+    write_behind_stop()
+    assert errors == [2]
+
+    db_disconnect(True)
+
+
+def test_write_behind_never_hangs():
+    if os.path.exists('test_write_behind.db'):
+        os.remove('test_write_behind.db')
+    result_classes = db_init(db_structure, 'sqlite', True, db_path='test_write_behind.db')
+    events = result_classes['events']
+    errors = []
+
+    write_behind_start(batch_size=10, flush_interval=0.1, max_queue_size=2,
+                       on_error=lambda e, rows: errors.append(rows))
+
+    with pytest.raises(SQLFoxIncorrectRow):
+        add_later(object())
+    add_later(events(id=1, name='first'))
+    add_later(events(id=2, name='second'))
+    assert write_behind_flush()
+
+    def add_many():
+        for i in range(3, 200):
+            try:
+                add_later(events(id=i, name=f'event_{i}'))
+            except SQLFoxWriteBehindNotStarted:
+                return
+
+    producer = threading.Thread(target=add_many)
+    producer.start()
+    db_disconnect(True)  # Must not hang, every accepted row must be written
+    producer.join()
+    assert errors == []
+
+    events = db_init(db_structure, 'sqlite', True, db_path='test_write_behind.db')['events']
+    last = max(i for i in range(1, 200) if get(events, {'id': i}) is not None)
+    assert all(get(events, {'id': i}) is not None for i in range(1, last + 1))
+
+    db_disconnect(True)
+
+
+def test_write_behind_retry_from_on_error():
+    if os.path.exists('test_write_behind.db'):
+        os.remove('test_write_behind.db')
+    result_classes = db_init(db_structure, 'sqlite', True, db_path='test_write_behind.db')
+    events = result_classes['events']
+    retried = []
+
+    def retry(e, rows):  # Duplicate ids get new ones, so on_error calls add_later from the writer thread
+        for row in rows:
+            retried.append(row.name)
+            add_later(events(id=1000 + len(retried), name=row.name))
+
+    write_behind_start(batch_size=3, flush_interval=10, max_queue_size=3, on_error=retry)
+    add_later(events(id=1, name='first'), timeout=0)  # timeout=0 still tries once
+    assert write_behind_flush(timeout=5)
+
+    for i in range(3):  # Full batch fails on duplicate id while the queue is full
+        add_later(events(id=1, name=f'duplicate_{i}'))
+    for i in range(3):
+        add_later(events(id=10 + i, name=f'event_{i}'))
+    assert write_behind_flush(timeout=5)
+    write_behind_stop()
+
+    assert retried == ['duplicate_0', 'duplicate_1', 'duplicate_2']
+    assert get(events, {'name': 'duplicate_2'}).id == 1003
+
+    write_behind_start(flush_interval=0.05, on_error=lambda e, rows: write_behind_stop())
+    add_later(events(id=1, name='stops the writer'))
+    time.sleep(0.5)
+    with pytest.raises(SQLFoxWriteBehindNotStarted):
+        add_later(events(id=2000, name='too late'))
+
+    db_disconnect(True)